@@ -4,41 +4,71 @@ Generate performance charts for mirror_hash blog post.
 Creates compelling visualizations that support the blog narrative.
 """
 
-import matplotlib.pyplot as plt
+import matplotlib as mpl
+# Pin headless Agg before pyplot is ever imported so it never negotiates a GUI
+# backend (e.g. MacOSX); this must stay above any pyplot import to take effect
+mpl.use('Agg', force=True)
+import matplotlib.font_manager as fm
 import matplotlib.patches as mpatches
 import numpy as np
-import os
-
-# Set style for clean, professional look
-plt.style.use('seaborn-v0_8-whitegrid')
-plt.rcParams['font.family'] = 'sans-serif'
-plt.rcParams['font.size'] = 11
-plt.rcParams['axes.labelsize'] = 12
-plt.rcParams['axes.titlesize'] = 14
-plt.rcParams['legend.fontsize'] = 10
-plt.rcParams['figure.facecolor'] = 'white'
+import argparse
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from PIL import Image
+
+# Set style for clean, professional look (pyplot is imported lazily, once per process)
+@functools.lru_cache(maxsize=None)
+def _init():
+    import matplotlib.pyplot as plt
+    plt.ioff()
+    plt.style.use('seaborn-v0_8-whitegrid')
+    mpl.rcParams.update({
+        'font.family': 'sans-serif',
+        'font.size': 11,
+        'axes.labelsize': 12,
+        'axes.titlesize': 14,
+        'legend.fontsize': 10,
+        'figure.facecolor': 'white',
+        # Let Agg drop near-colinear vertices and chunk long paths
+        'path.simplify': True,
+        'path.simplify_threshold': 1.0,
+        'agg.path.chunksize': 10000,
+        # Labels are plain text, so skip the mathtext parser
+        'text.parse_math': False,
+    })
+    return plt
+
+# Warm the font cache at import so forked workers inherit it
+fm.findfont(fm.FontProperties(family=['sans-serif']))
 
 # Output directory
 OUTPUT_DIR = "/Users/random_person/franciscothiesen.github.io/images"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+OUT = Path(OUTPUT_DIR)
+OUT.mkdir(parents=True, exist_ok=True)
+
+# Output paths without extension; _fast_save picks the suffix per format
+PATHS = {name: OUT / f'mirror-hash-{name}'
+         for name in ['throughput', 'speedup', 'latency', 'instructions', 'combined']}
 
 # Benchmark data from actual runs (M3 Max Pro MacBook, mirror_hash v2.1)
 # Size in bytes, times in nanoseconds
-sizes = [8, 16, 24, 32, 48, 64, 96, 128, 192, 256, 384, 512, 768, 1024, 2048, 4096, 8192]
+sizes = np.array([8, 16, 24, 32, 48, 64, 96, 128, 192, 256, 384, 512, 768, 1024, 2048, 4096, 8192], dtype=np.float64)
 
 # mirror_hash v2.1 times (optimized single-state AES with overlapping read)
-mirror_ns = [1.73, 1.72, 1.88, 1.88, 1.97, 2.41, 3.18, 3.50, 3.75, 4.01, 5.07, 5.88, 7.76, 9.62, 17.53, 31.95, 61.26]
+mirror_ns = np.array([1.73, 1.72, 1.88, 1.88, 1.97, 2.41, 3.18, 3.50, 3.75, 4.01, 5.07, 5.88, 7.76, 9.62, 17.53, 31.95, 61.26], dtype=np.float64)
 
 # rapidhash times
-rapid_ns = [1.34, 1.34, 1.88, 1.87, 2.15, 2.50, 3.57, 4.14, 6.27, 6.74, 9.23, 11.80, 18.73, 20.51, 40.44, 78.22, 148.47]
+rapid_ns = np.array([1.34, 1.34, 1.88, 1.87, 2.15, 2.50, 3.57, 4.14, 6.27, 6.74, 9.23, 11.80, 18.73, 20.51, 40.44, 78.22, 148.47], dtype=np.float64)
 
 # GxHash times (from gxhash comparison benchmark - fewer data points, interpolated)
-gx_sizes = [8, 64, 128, 256, 512, 1024, 4096, 8192]
-gx_ns = [2.21, 4.02, 3.48, 4.29, 6.17, 9.91, 38.60, 79.42]
+gx_sizes = np.array([8, 64, 128, 256, 512, 1024, 4096, 8192], dtype=np.float64)
+gx_ns = np.array([2.21, 4.02, 3.48, 4.29, 6.17, 9.91, 38.60, 79.42], dtype=np.float64)
 
 # Calculate throughput in GB/s
 def calc_throughput(sizes, times_ns):
-    return [s / t for s, t in zip(sizes, times_ns)]
+    return np.asarray(sizes, dtype=np.float64) / np.asarray(times_ns, dtype=np.float64)
 
 mirror_gbps = calc_throughput(sizes, mirror_ns)
 rapid_gbps = calc_throughput(sizes, rapid_ns)
@@ -54,23 +84,35 @@ ZONE_COLORS = {
     'even': '#ffffcc'
 }
 
+def _fast_save(fig, path, emit_svg=False, fmt='webp', webp_method=4, dpi=100):
+    """Rasterize once with Agg and hand the RGBA buffer straight to Pillow."""
+    fig.set_dpi(dpi)
+    buf, size = fig.canvas.print_to_buffer()
+    img = Image.frombuffer('RGBA', size, buf, 'raw', 'RGBA', 0, 1).convert('RGB')
+    out = path.with_suffix(f'.{fmt}')
+    if fmt == 'webp':
+        img.save(out, 'WEBP', quality=85, method=webp_method)
+    else:
+        img.save(out)
+    if emit_svg:
+        fig.savefig(path.with_suffix('.svg'), dpi=dpi)
+    print(f"Created: {out}")
+
 # =============================================================================
 # Chart 1: Throughput Comparison (Log-Log Scale)
 # =============================================================================
-def create_throughput_chart():
-    fig, ax = plt.subplots(figsize=(10, 6))
-
+def _plot_throughput(ax):
     ax.loglog(sizes, mirror_gbps, 'o-', color=MIRROR_COLOR, linewidth=2.5,
-              markersize=8, label='mirror_hash', zorder=3)
+              markersize=8, label='mirror_hash', zorder=3, solid_joinstyle='round')
     ax.loglog(sizes, rapid_gbps, 's--', color=RAPID_COLOR, linewidth=2,
-              markersize=6, label='rapidhash', zorder=2)
+              markersize=6, label='rapidhash', zorder=2, solid_joinstyle='round')
     ax.loglog(gx_sizes, gx_gbps, '^:', color=GX_COLOR, linewidth=2,
-              markersize=6, label='GxHash', zorder=2)
+              markersize=6, label='GxHash', zorder=2, solid_joinstyle='round')
 
-    # Add zone annotations
-    ax.axvspan(8, 16, alpha=0.15, color='blue', label='_rapidhash territory')
-    ax.axvspan(17, 48, alpha=0.15, color='red', label='_transition zone')
-    ax.axvspan(64, 8192, alpha=0.08, color='green', label='_mirror_hash territory')
+    # Add zone annotations (rasterized so SVG output embeds them as one image)
+    ax.axvspan(8, 16, alpha=0.15, color='blue', label='_rapidhash territory', rasterized=True)
+    ax.axvspan(17, 48, alpha=0.15, color='red', label='_transition zone', rasterized=True)
+    ax.axvspan(64, 8192, alpha=0.08, color='green', label='_mirror_hash territory', rasterized=True)
 
     # Add text annotations for zones
     ax.text(11, 2, 'Small\n(~even)', fontsize=9, ha='center', va='bottom', alpha=0.7)
@@ -89,42 +131,40 @@ def create_throughput_chart():
     # Custom x-axis labels
     ax.set_xticks([8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192])
     ax.set_xticklabels(['8B', '16B', '32B', '64B', '128B', '256B', '512B', '1KB', '2KB', '4KB', '8KB'])
-
-    plt.tight_layout()
-    plt.savefig(f'{OUTPUT_DIR}/mirror-hash-throughput.png', dpi=150, bbox_inches='tight')
-    plt.savefig(f'{OUTPUT_DIR}/mirror-hash-throughput.svg', bbox_inches='tight')
-    print(f"Created: {OUTPUT_DIR}/mirror-hash-throughput.png")
-    plt.close()
+    # Plain-text decade labels: the default log formatter relies on mathtext
+    ax.set_yticks([1, 10, 100])
+    ax.set_yticklabels(['1', '10', '100'])
+
+def create_throughput_chart(fig, **save_opts):
+    fig.clf()
+    fig.set_size_inches(10, 6)
+    _plot_throughput(fig.add_subplot())
+    fig.subplots_adjust(left=0.07, right=0.98, top=0.89, bottom=0.10)
+    _fast_save(fig, PATHS['throughput'], **save_opts)
+    fig.clf()
 
 # =============================================================================
 # Chart 2: Speedup Bar Chart (Key Sizes)
 # =============================================================================
-def create_speedup_chart():
+def _plot_speedup(ax):
     # Select key sizes for bar chart
     key_sizes = [8, 32, 64, 128, 256, 512, 1024, 4096, 8192]
     key_labels = ['8B', '32B', '64B', '128B', '256B', '512B', '1KB', '4KB', '8KB']
 
     # Calculate speedup (positive = mirror wins, negative = rapidhash wins)
-    speedups = []
-    for sz in key_sizes:
-        idx = sizes.index(sz)
-        speedup = (rapid_ns[idx] / mirror_ns[idx] - 1) * 100
-        speedups.append(speedup)
-
-    fig, ax = plt.subplots(figsize=(10, 5))
+    idx = np.searchsorted(sizes, key_sizes)
+    speedups = (rapid_ns[idx] / mirror_ns[idx] - 1) * 100
 
     colors = [MIRROR_COLOR if s > 0 else RAPID_COLOR for s in speedups]
-    bars = ax.bar(key_labels, speedups, color=colors, edgecolor='white', linewidth=1.5)
-
-    # Add value labels on bars
-    for bar, speedup in zip(bars, speedups):
-        height = bar.get_height()
-        label = f'+{speedup:.0f}%' if speedup > 0 else f'{speedup:.0f}%'
-        va = 'bottom' if height > 0 else 'top'
-        offset = 3 if height > 0 else -3
-        ax.annotate(label, xy=(bar.get_x() + bar.get_width()/2, height),
-                   xytext=(0, offset), textcoords='offset points',
-                   ha='center', va=va, fontsize=10, fontweight='bold')
+    # Bar centers are known up front (0..N-1), so skip the string-category axis
+    centers = np.arange(len(key_labels))
+    bars = ax.bar(centers, speedups, color=colors, edgecolor='white', linewidth=1.5)
+    ax.set_xticks(centers)
+    ax.set_xticklabels(key_labels)
+
+    # Add value labels on bars (bar_label flips below the bar for negative values)
+    labels = [f'+{s:.0f}%' if s > 0 else f'{s:.0f}%' for s in speedups]
+    ax.bar_label(bars, labels=labels, padding=3, fontsize=10, fontweight='bold')
 
     ax.axhline(y=0, color='black', linestyle='-', linewidth=0.8)
     ax.set_ylabel('Speedup (%)')
@@ -138,23 +178,23 @@ def create_speedup_chart():
 
     ax.set_ylim(-80, 200)
 
-    plt.tight_layout()
-    plt.savefig(f'{OUTPUT_DIR}/mirror-hash-speedup.png', dpi=150, bbox_inches='tight')
-    plt.savefig(f'{OUTPUT_DIR}/mirror-hash-speedup.svg', bbox_inches='tight')
-    print(f"Created: {OUTPUT_DIR}/mirror-hash-speedup.png")
-    plt.close()
+def create_speedup_chart(fig, **save_opts):
+    fig.clf()
+    fig.set_size_inches(10, 5)
+    _plot_speedup(fig.add_subplot())
+    fig.subplots_adjust(left=0.08, right=0.98, top=0.87, bottom=0.12)
+    _fast_save(fig, PATHS['speedup'], **save_opts)
+    fig.clf()
 
 # =============================================================================
 # Chart 3: Latency Comparison (Linear Scale, Focused)
 # =============================================================================
-def create_latency_chart():
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
-
+def _plot_latency(ax1, ax2):
     # Left panel: Small inputs (8-64 bytes)
     small_sizes = [8, 16, 24, 32, 48, 64]
-    small_idx = [sizes.index(s) for s in small_sizes]
-    small_mirror = [mirror_ns[i] for i in small_idx]
-    small_rapid = [rapid_ns[i] for i in small_idx]
+    small_idx = np.searchsorted(sizes, small_sizes)
+    small_mirror = mirror_ns[small_idx]
+    small_rapid = rapid_ns[small_idx]
 
     x = np.arange(len(small_sizes))
     width = 0.35
@@ -171,14 +211,14 @@ def create_latency_chart():
 
     # Add annotation for transition zone
     ax1.axvspan(1.5, 4.5, alpha=0.2, color='red')
-    ax1.text(3, 3.8, 'Transition Zone\n(17-48B)', ha='center', fontsize=9,
+    ax1.text(3, 2.25, 'Transition Zone\n(17-48B)', ha='center', va='bottom', fontsize=9,
              color='darkred', style='italic')
 
     # Right panel: Large inputs (128B - 8KB)
     large_sizes = [128, 256, 512, 1024, 2048, 4096, 8192]
-    large_idx = [sizes.index(s) for s in large_sizes]
-    large_mirror = [mirror_ns[i] for i in large_idx]
-    large_rapid = [rapid_ns[i] for i in large_idx]
+    large_idx = np.searchsorted(sizes, large_sizes)
+    large_mirror = mirror_ns[large_idx]
+    large_rapid = rapid_ns[large_idx]
 
     x = np.arange(len(large_sizes))
 
@@ -193,35 +233,34 @@ def create_latency_chart():
     ax2.legend()
 
     # Add speedup annotations on large chart
-    for i, (r, m) in enumerate(zip(large_rapid, large_mirror)):
-        speedup = (r/m - 1) * 100
-        ax2.annotate(f'+{speedup:.0f}%', xy=(i + width/2, m),
-                    xytext=(0, 5), textcoords='offset points',
-                    ha='center', va='bottom', fontsize=8, color='darkgreen')
-
-    plt.tight_layout()
-    plt.savefig(f'{OUTPUT_DIR}/mirror-hash-latency.png', dpi=150, bbox_inches='tight')
-    plt.savefig(f'{OUTPUT_DIR}/mirror-hash-latency.svg', bbox_inches='tight')
-    print(f"Created: {OUTPUT_DIR}/mirror-hash-latency.png")
-    plt.close()
+    large_speedups = (large_rapid / large_mirror - 1) * 100
+    ax2.bar_label(bars2, labels=[f'+{s:.0f}%' for s in large_speedups],
+                  padding=5, fontsize=8, color='darkgreen')
+
+def create_latency_chart(fig, **save_opts):
+    fig.clf()
+    fig.set_size_inches(12, 5)
+    _plot_latency(*fig.subplots(1, 2))
+    fig.subplots_adjust(left=0.06, right=0.98, top=0.92, bottom=0.12, wspace=0.2)
+    _fast_save(fig, PATHS['latency'], **save_opts)
+    fig.clf()
 
 # =============================================================================
 # Chart 4: The "Why AES Wins" Instruction Count Visualization
 # =============================================================================
-def create_instruction_chart():
-    fig, ax = plt.subplots(figsize=(8, 5))
-
+def _plot_instructions(ax):
     categories = ['rapidhash\n(128-bit multiply)', 'mirror_hash\n(AES round)']
-    instructions = [3, 2]
-    cycles = [4.5, 2]  # Approximate cycles
-    bytes_processed = [16, 16]
+    instructions = np.array([3, 2])
+    cycles = np.array([4.5, 2.0])  # Approximate cycles
+    bytes_processed = np.array([16, 16])
+    cycles_per_byte = cycles / bytes_processed
 
     x = np.arange(len(categories))
     width = 0.3
 
     bars1 = ax.bar(x - width, instructions, width, label='Instructions', color='#3498db')
     bars2 = ax.bar(x, cycles, width, label='Cycles (approx)', color='#e74c3c')
-    bars3 = ax.bar(x + width, [c/16 for c in cycles], width, label='Cycles/Byte', color='#2ecc71')
+    bars3 = ax.bar(x + width, cycles_per_byte, width, label='Cycles/Byte', color='#2ecc71')
 
     ax.set_ylabel('Count')
     ax.set_title('Why AES is Faster: Instruction Efficiency\n(per 16 bytes of mixing)')
@@ -230,33 +269,79 @@ def create_instruction_chart():
     ax.legend()
 
     # Add value labels
-    for bars in [bars1, bars2, bars3]:
-        for bar in bars:
-            height = bar.get_height()
-            ax.annotate(f'{height:.2f}' if height < 1 else f'{height:.1f}',
-                       xy=(bar.get_x() + bar.get_width()/2, height),
-                       xytext=(0, 3), textcoords='offset points',
-                       ha='center', va='bottom', fontsize=9)
+    ax.bar_label(bars1, labels=[f'{h:.1f}' for h in instructions], padding=3, fontsize=9)
+    ax.bar_label(bars2, labels=[f'{h:.1f}' for h in cycles], padding=3, fontsize=9)
+    ax.bar_label(bars3, labels=[f'{h:.2f}' for h in cycles_per_byte], padding=3, fontsize=9)
 
     # Add explanatory text
     ax.text(0.5, -0.15,
             'AES uses dedicated silicon: AESE+AESMC fuse into ~2 cycles on Apple Silicon',
             transform=ax.transAxes, ha='center', fontsize=9, style='italic', alpha=0.7)
 
-    plt.tight_layout()
-    plt.savefig(f'{OUTPUT_DIR}/mirror-hash-instructions.png', dpi=150, bbox_inches='tight')
-    plt.savefig(f'{OUTPUT_DIR}/mirror-hash-instructions.svg', bbox_inches='tight')
-    print(f"Created: {OUTPUT_DIR}/mirror-hash-instructions.png")
-    plt.close()
+def create_instruction_chart(fig, **save_opts):
+    fig.clf()
+    fig.set_size_inches(8, 5)
+    _plot_instructions(fig.add_subplot())
+    fig.subplots_adjust(left=0.07, right=0.98, top=0.87, bottom=0.16)
+    _fast_save(fig, PATHS['instructions'], **save_opts)
+    fig.clf()
+
+# =============================================================================
+# Combined: all four charts in one 2x2 grid, rendered and saved once
+# =============================================================================
+def create_combined_chart(fig, **save_opts):
+    fig.clf()
+    fig.set_size_inches(20, 12)
+    gs = fig.add_gridspec(2, 2)
+    _plot_throughput(fig.add_subplot(gs[0, 0]))
+    _plot_speedup(fig.add_subplot(gs[0, 1]))
+    _plot_latency(*gs[1, 0].subgridspec(1, 2, wspace=0.25).subplots())
+    _plot_instructions(fig.add_subplot(gs[1, 1]))
+    fig.subplots_adjust(left=0.04, right=0.99, top=0.94, bottom=0.08, hspace=0.3, wspace=0.12)
+    _fast_save(fig, PATHS['combined'], **save_opts)
+    fig.clf()
 
 # =============================================================================
 # Generate all charts
 # =============================================================================
+CHARTS = [create_throughput_chart, create_speedup_chart, create_latency_chart, create_instruction_chart]
+
+# One Figure per worker process, reused for every chart that worker draws
+_worker_fig = None
+
+def _render(chart, save_opts):
+    global _worker_fig
+    if _worker_fig is None:
+        _worker_fig = _init().figure(figsize=(12, 6), dpi=save_opts.get('dpi', 100))
+    chart(_worker_fig, **save_opts)
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    # SVG output is opt-in: it is a second, much slower render pass per chart
+    parser.add_argument('--svg', action=argparse.BooleanOptionalAction, default=False,
+                        help='also write an SVG next to each image')
+    parser.add_argument('--png', action='store_true',
+                        help='write PNG instead of WebP')
+    parser.add_argument('--draft', action='store_true',
+                        help='fastest WebP encoding, for iterating on the charts')
+    parser.add_argument('--hires', action='store_true',
+                        help='render at 150 dpi instead of the default 100')
+    parser.add_argument('--separate', action='store_true',
+                        help='write the four charts as separate images instead of one combined grid')
+    args = parser.parse_args()
+    save_opts = {
+        'emit_svg': args.svg,
+        'fmt': 'png' if args.png else 'webp',
+        'webp_method': 0 if args.draft else 4,
+        'dpi': 150 if args.hires else 100,
+    }
+
     print("Generating blog charts...")
-    create_throughput_chart()
-    create_speedup_chart()
-    create_latency_chart()
-    create_instruction_chart()
+    if args.separate:
+        # Charts are independent, so render them in parallel (wall time = slowest chart)
+        with ProcessPoolExecutor(max_workers=len(CHARTS)) as ex:
+            list(ex.map(_render, CHARTS, repeat(save_opts)))
+    else:
+        _render(create_combined_chart, save_opts)
     print("\nAll charts generated successfully!")
     print(f"Output directory: {OUTPUT_DIR}")